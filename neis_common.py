@@ -0,0 +1,179 @@
+import re
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+import streamlit as st
+import requests_cache
+from requests.adapters import HTTPAdapter
+import datetime
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+
+# ---------- 공통 설정 ----------
+# 여러 페이지가 같은 객체를 import해서 세션과 응답 캐시를 공유
+NEIS_BASE = "https://open.neis.go.kr/hub"
+# 응답 캐시 유효 기간 (오래 보관하는 캐시는 아래 SQLite 한 곳에서만 관리)
+SCHOOL_TTL = 7 * 24 * 3600
+MEAL_TTL = 24 * 3600
+PAST_MEAL_TTL = 30 * 24 * 3600  # 지난 날짜의 급식은 거의 바뀌지 않음
+# 재실행 때마다 SQLite/NEIS를 다시 읽지 않도록 둔 짧은 메모리 캐시 (SQLite가 저장하지 않는 빈 결과 포함)
+MEMO_TTL = 10 * 60
+_BR_TAG = re.compile(r"<br/?>")
+_DIGIT_DOT = re.compile(r"[0-9]+\.")
+# 화면에서 쓰는 급식 필드 (ORPLC_INFO, NTR_INFO 등 긴 문자열은 바로 버림)
+_MEAL_FIELDS = ("MLSV_YMD", "MMEAL_SC_CODE", "DDISH_NM", "CAL_INFO")
+
+
+def _key_digest(api_key: str):
+    """API Key 원문 대신 쓰는 해시값"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def _cache_key(request, **kwargs):
+    """KEY를 뺀 요청으로 캐시 키를 만들고 KEY는 해시로만 덧붙이기 (원문은 디스크에 남기지 않음)"""
+    api_key = parse_qs(urlparse(request.url).query).get("KEY", [""])[0]
+    return f"{requests_cache.create_key(request, **kwargs)}-{_key_digest(api_key)[:16]}"
+
+
+# 워커 프로세스당 하나의 세션을 두어 NEIS 연결(TCP+TLS)을 재사용하고,
+# 응답은 SQLite에 저장해 프로세스 재시작/새 세션에서도 캐시를 활용
+SESSION = requests_cache.CachedSession(
+    cache_name=".neis_cache",
+    backend="sqlite",
+    expire_after=MEAL_TTL,
+    # 저장되는 요청에서는 KEY를 지우고, 캐시 키는 Key별로 분리
+    ignored_parameters=["KEY"],
+    key_fn=_cache_key,
+    # 인증 오류 등 데이터가 없는 응답은 저장하지 않음
+    filter_fn=lambda resp: b'"row"' in resp.content
+)
+SESSION.cache.delete(expired=True)
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+SESSION.headers.update({"Accept-Encoding": "gzip"})
+
+# 후보 학교 급식 선조회용 (세션 풀 크기 안에서 동작)
+# Streamlit 캐시는 건드리지 않고 _fetch_meal_range로 SQLite 응답 캐시만 채움
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=4)
+_prefetched = {}  # (API Key 해시, 교육청, 학교, 연, 월) -> 제출 시각
+_prefetch_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+# ---------- 함수 정의 ----------
+def _service_rows(data, service: str):
+    """NEIS 응답 [head, {"row": [...]}] 구조에서 row 목록만 꺼내기 (없으면 빈 목록)"""
+    svc = data.get(service)
+    if svc and len(svc) > 1 and isinstance(svc[1], dict):
+        return svc[1].get("row", [])
+    return []
+
+
+@st.cache_data(show_spinner=False, ttl=MEMO_TTL)
+def find_school(api_key: str, name: str):
+    """학교명으로 NEIS에서 학교 검색"""
+    params = {
+        "KEY": api_key,
+        "Type": "json",
+        "pIndex": 1,
+        "pSize": 100,
+        "SCHUL_NM": name
+    }
+    r = SESSION.get(f"{NEIS_BASE}/schoolInfo", params=params, timeout=10, expire_after=SCHOOL_TTL)
+    if r.status_code != 200:
+        return []
+    data = orjson.loads(r.content)
+    rows = _service_rows(data, "schoolInfo")
+    return [
+        {
+            "label": f"{r['SCHUL_NM']} ({r['ATPT_OFCDC_SC_NM']})",
+            "ATPT_OFCDC_SC_CODE": r["ATPT_OFCDC_SC_CODE"],
+            "SD_SCHUL_CODE": r["SD_SCHUL_CODE"],
+            "name": r["SCHUL_NM"],
+            "office": r["ATPT_OFCDC_SC_NM"]
+        }
+        for r in rows
+    ]
+
+
+def _fetch_meal_range(api_key: str, atpt_code: str, sch_code: str, start_date: str, end_date: str):
+    """기간 내 급식 정보 가져오기 (Streamlit 캐시를 거치지 않으므로 백그라운드 스레드에서도 사용)"""
+    # 하루 최대 3끼(조식/중식/석식) 기준으로 필요한 만큼만 요청 (NEIS 최대 1000)
+    days = (datetime.datetime.strptime(end_date, "%Y%m%d") - datetime.datetime.strptime(start_date, "%Y%m%d")).days + 1
+    params = {
+        "KEY": api_key,
+        "Type": "json",
+        "ATPT_OFCDC_SC_CODE": atpt_code,
+        "SD_SCHUL_CODE": sch_code,
+        "pIndex": 1,
+        "pSize": min(days * 3, 1000),
+        "MLSV_FROM_YMD": start_date,
+        "MLSV_TO_YMD": end_date
+    }
+    expire_after = PAST_MEAL_TTL if end_date < datetime.date.today().strftime("%Y%m%d") else MEAL_TTL
+    r = SESSION.get(f"{NEIS_BASE}/mealServiceDietInfo", params=params, timeout=10, expire_after=expire_after)
+    if r.status_code != 200:
+        return []
+    data = orjson.loads(r.content)
+    rows = _service_rows(data, "mealServiceDietInfo")
+    return [{k: m.get(k, "") for k in _MEAL_FIELDS} for m in rows]
+
+
+@st.cache_data(show_spinner=False, ttl=MEMO_TTL)
+def get_meal_range(api_key: str, atpt_code: str, sch_code: str, start_date: str, end_date: str):
+    """기간 내 급식 정보 가져오기"""
+    return _fetch_meal_range(api_key, atpt_code, sch_code, start_date, end_date)
+
+
+def _quarter_range(year: int, month: int):
+    """전달 1일 ~ 다음달 말일 (YYYYMMDD)"""
+    first_day = datetime.date(year, month, 1)
+    start = (first_day - datetime.timedelta(days=1)).replace(day=1)
+    next_month = (first_day + datetime.timedelta(days=32)).replace(day=1)
+    end = (next_month + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+    return start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+
+
+def get_meal_quarter(api_key: str, atpt_code: str, sch_code: str, year: int, month: int):
+    """전달~다음달 3개월치 급식 정보를 한 번에 가져오기 (인접한 주/월 이동 시 캐시 공유)"""
+    return get_meal_range(api_key, atpt_code, sch_code, *_quarter_range(year, month))
+
+
+def prefetch_meals(api_key: str, schools: list, date: datetime.date):
+    """후보 학교들의 급식을 백그라운드에서 미리 조회해 캐시를 채워두기"""
+    # 주간 조회와 같은 캐시 키를 쓰도록 해당 주의 월요일 기준으로 조회
+    week_start = date - datetime.timedelta(days=date.weekday())
+    digest = _key_digest(api_key)
+    now = time.monotonic()
+    with _prefetch_lock:
+        # SQLite 캐시가 MEAL_TTL 뒤 만료되므로 그보다 오래된 기록은 지워 다시 선조회
+        for key in [k for k, submitted in _prefetched.items() if now - submitted >= MEAL_TTL]:
+            del _prefetched[key]
+        for school in schools:
+            key = (digest, school["ATPT_OFCDC_SC_CODE"], school["SD_SCHUL_CODE"], week_start.year, week_start.month)
+            # 재실행할 때마다 같은 조회를 다시 넣지 않도록 유효 기간 안에서는 키당 한 번만 제출
+            if key in _prefetched:
+                continue
+            _prefetched[key] = now
+            future = _PREFETCH_POOL.submit(_fetch_meal_range, api_key, *key[1:3], *_quarter_range(*key[3:]))
+            future.add_done_callback(lambda f, key=key: _log_prefetch_error(f, key))
+
+
+def _log_prefetch_error(future, key):
+    """선조회 실패는 로그로 남기고 다음에 다시 시도할 수 있게 키를 풀어두기"""
+    exc = future.exception()
+    if exc is not None:
+        with _prefetch_lock:
+            _prefetched.pop(key, None)
+        logger.warning("급식 선조회 실패 (%s, %s, %d-%02d): %r", *key[1:], exc)
+
+
+def clean_menu(menus: pd.Series):
+    """메뉴 문자열 정리 (열 단위로 한 번에 처리)"""
+    return (
+        menus.fillna("")
+        .str.replace(_BR_TAG, "\n", regex=True)
+        .str.replace(_DIGIT_DOT, "", regex=True)
+        .str.strip()
+    )
@@ -1,12 +1,13 @@
 import streamlit as st
-import requests
 import datetime
 import pandas as pd
+from neis_common import find_school, get_meal_quarter, prefetch_meals, clean_menu
 
 # ---------- 기본 설정 ----------
 st.set_page_config(page_title="학교 급식 주간 조회", layout="centered")
-NEIS_BASE = "https://open.neis.go.kr/hub"
 DEFAULT_KEY = st.secrets.get("NEIS_API_KEY", None)
+_LUNCH_CODES = {"2", 2}
+_WEEKDAY_KR = ("월", "화", "수", "목", "금", "토", "일")
 
 st.title("🍱 전국 학교 급식 주간 조회")
 st.caption("NEIS Open API를 이용해 선택한 날짜가 포함된 주의 급식 메뉴를 보여줍니다.")
@@ -18,79 +19,15 @@ if not API_KEY:
     st.warning("NEIS API Key가 필요합니다. [NEIS Open API](https://open.neis.go.kr)에서 발급받아 주세요.")
     st.stop()
 
-# ---------- 함수 정의 ----------
-@st.cache_data(show_spinner=False)
-def find_school(api_key: str, name: str):
-    """학교명으로 NEIS에서 학교 검색"""
-    params = {
-        "KEY": api_key,
-        "Type": "json",
-        "pIndex": 1,
-        "pSize": 100,
-        "SCHUL_NM": name
-    }
-    r = requests.get(f"{NEIS_BASE}/schoolInfo", params=params, timeout=10)
-    if r.status_code != 200:
-        return []
-    data = r.json()
-    if "schoolInfo" not in data:
-        return []
-    try:
-        rows = data["schoolInfo"][1]["row"]
-    except Exception:
-        return []
-    return [
-        {
-            "label": f"{r['SCHUL_NM']} ({r['ATPT_OFCDC_SC_NM']})",
-            "ATPT_OFCDC_SC_CODE": r["ATPT_OFCDC_SC_CODE"],
-            "SD_SCHUL_CODE": r["SD_SCHUL_CODE"],
-            "name": r["SCHUL_NM"],
-            "office": r["ATPT_OFCDC_SC_NM"]
-        }
-        for r in rows
-    ]
-
-
-@st.cache_data(show_spinner=False)
-def get_meal_range(api_key: str, atpt_code: str, sch_code: str, start_date: str, end_date: str):
-    """기간 내 급식 정보 가져오기"""
-    params = {
-        "KEY": api_key,
-        "Type": "json",
-        "ATPT_OFCDC_SC_CODE": atpt_code,
-        "SD_SCHUL_CODE": sch_code,
-        "MLSV_FROM_YMD": start_date,
-        "MLSV_TO_YMD": end_date
-    }
-    r = requests.get(f"{NEIS_BASE}/mealServiceDietInfo", params=params, timeout=10)
-    if r.status_code != 200:
-        return []
-    data = r.json()
-    if "mealServiceDietInfo" not in data:
-        return []
-    try:
-        rows = data["mealServiceDietInfo"][1]["row"]
-    except Exception:
-        return []
-    return rows
-
-
-def clean_menu(txt):
-    """메뉴 문자열 정리"""
-    if not txt:
-        return ""
-    txt = txt.replace("<br/>", "\n").replace("<br>", "\n")
-    import re
-    txt = re.sub(r"[0-9]+\.", "", txt)
-    return txt.strip()
-
-
 # ---------- UI: 학교 자동완성 ----------
 school_query = st.text_input("🏫 학교명 입력", placeholder="예: 서울고등학교")
 
 if school_query:
     results = find_school(API_KEY, school_query)
     if results:
+        # 후보가 적으면 선택 전에 급식을 미리 받아두어 조회 시 바로 표시
+        if len(results) <= 5:
+            prefetch_meals(API_KEY, results, st.session_state.get("selected_date", datetime.date.today()))
         school_option = st.selectbox("검색된 학교", results, format_func=lambda x: x["label"])
     else:
         st.warning("검색된 학교가 없습니다.")
@@ -99,52 +36,60 @@ else:
     st.info("학교명을 입력하면 자동완성 목록이 표시됩니다.")
     st.stop()
 
-# ---------- 날짜 선택 ----------
-selected_date = st.date_input("📅 날짜 선택", value=datetime.date.today())
-
-# 선택된 날짜가 포함된 주 계산 (월요일~일요일)
-week_start = selected_date - datetime.timedelta(days=selected_date.weekday())
-week_end = week_start + datetime.timedelta(days=6)
-
-st.markdown(f"**📆 주간 기간:** {week_start} ~ {week_end}")
-
-if st.button("주간 급식 조회"):
-    with st.spinner("급식 정보를 불러오는 중..."):
-        meals = get_meal_range(
-            API_KEY,
-            school_option["ATPT_OFCDC_SC_CODE"],
-            school_option["SD_SCHUL_CODE"],
-            week_start.strftime("%Y%m%d"),
-            week_end.strftime("%Y%m%d")
-        )
-
-    if not meals:
-        st.warning("선택한 주간의 급식 정보가 없습니다.")
-        st.stop()
-
-    # 점심만 필터링
-    lunch = [m for m in meals if str(m.get("MMEAL_SC_CODE")) == "2"]
-
-    if not lunch:
-        st.info("해당 주간에 점심 급식 정보가 없습니다.")
-        st.stop()
-
-    df = pd.DataFrame([
-        {
-            "date": datetime.datetime.strptime(m["MLSV_YMD"], "%Y%m%d").date(),
-            "menu": clean_menu(m["DDISH_NM"]),
-            "kcal": m.get("CAL_INFO", "")
-        }
-        for m in lunch
-    ])
-    df = df.sort_values("date")
-
-    st.subheader(f"🍱 {school_option['name']} ({week_start} ~ {week_end}) 주간 급식표")
-
-    for _, row in df.iterrows():
-        weekday_name = ["월", "화", "수", "목", "금", "토", "일"][row["date"].weekday()]
-        st.markdown(f"### 🗓️ {row['date']} ({weekday_name}요일)")
-        st.markdown(row["menu"])
-        if row["kcal"]:
-            st.caption(f"칼로리: {row['kcal']}")
-        st.write("---")
+# ---------- 날짜 선택 / 주간 급식 ----------
+# 날짜 변경·조회 버튼은 이 영역만 다시 실행 (학교 검색 등 위쪽 로직은 재실행하지 않음)
+@st.fragment
+def weekly_meals(school_option):
+    """선택한 날짜가 포함된 주의 점심 급식표"""
+    selected_date = st.date_input("📅 날짜 선택", value=datetime.date.today(), key="selected_date")
+
+    # 선택된 날짜가 포함된 주 계산 (월요일~일요일)
+    week_start = selected_date - datetime.timedelta(days=selected_date.weekday())
+    week_end = week_start + datetime.timedelta(days=6)
+
+    st.markdown(f"**📆 주간 기간:** {week_start} ~ {week_end}")
+
+    if st.button("주간 급식 조회"):
+        with st.spinner("급식 정보를 불러오는 중..."):
+            meals = get_meal_quarter(
+                API_KEY,
+                school_option["ATPT_OFCDC_SC_CODE"],
+                school_option["SD_SCHUL_CODE"],
+                week_start.year,
+                week_start.month
+            )
+
+        # 캐시된 3개월치 데이터에서 해당 주간만 잘라내기
+        start_ymd, end_ymd = week_start.strftime("%Y%m%d"), week_end.strftime("%Y%m%d")
+        meals = [m for m in meals if start_ymd <= m["MLSV_YMD"] <= end_ymd]
+
+        if not meals:
+            st.warning("선택한 주간의 급식 정보가 없습니다.")
+            return
+
+        # 점심만 필터링
+        lunch = [m for m in meals if m.get("MMEAL_SC_CODE") in _LUNCH_CODES]
+
+        if not lunch:
+            st.info("해당 주간에 점심 급식 정보가 없습니다.")
+            return
+
+        # YYYYMMDD 문자열 정렬 = 날짜순 정렬
+        lunch.sort(key=lambda m: m["MLSV_YMD"])
+        df = pd.DataFrame(lunch)
+        df["date"] = pd.to_datetime(df["MLSV_YMD"], format="%Y%m%d").dt.date
+        df["menu"] = clean_menu(df["DDISH_NM"])
+        df["kcal"] = df["CAL_INFO"]
+
+        st.subheader(f"🍱 {school_option['name']} ({week_start} ~ {week_end}) 주간 급식표")
+
+        for row in df[["date", "menu", "kcal"]].itertuples(index=False):
+            weekday_name = _WEEKDAY_KR[row.date.weekday()]
+            st.markdown(f"### 🗓️ {row.date} ({weekday_name}요일)")
+            st.markdown(row.menu)
+            if row.kcal:
+                st.caption(f"칼로리: {row.kcal}")
+            st.write("---")
+
+
+weekly_meals(school_option)